@@ -1,13 +1,21 @@
 import sys
 import os
+import re
+import logging
+import shutil
 import subprocess
-import threading
+import tempfile
+import time
+from collections import deque
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+import psutil
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QLabel, QLineEdit, QPushButton, QFileDialog, QListWidget,
-    QListWidgetItem, QCheckBox, QProgressBar, QTextEdit, QMessageBox, QGroupBox
+    QListWidgetItem, QCheckBox, QSpinBox, QProgressBar, QTextEdit, QMessageBox, QGroupBox
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThread, QThreadPool, pyqtSignal
 from PyQt6.QtGui import QFont, QPalette, QColor
 from huggingface_hub import HfApi
 
@@ -21,6 +29,110 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
+def find_aria2c():
+    """查找 aria2c：优先使用程序目录下附带的版本，其次使用 PATH 中已安装的 aria2c"""
+    bundled = resource_path("aria2c.exe" if sys.platform == "win32" else "aria2c")
+    if os.path.exists(bundled):
+        return bundled
+    return shutil.which("aria2c")
+
+# 隐藏 aria2c 的控制台窗口，该标志仅在 Windows 上存在
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# 限速格式，例如 "500K"、"2M"（aria2c 只接受整数加 K/M 单位）
+SPEED_LIMIT_RE = re.compile(r"\d+[KM]", re.IGNORECASE)
+
+# aria2c 进度输出，例如 "[#000001 400.0KiB/33.2MiB(1%) CN:8 DL:115.7KiB ETA:4m51s]"
+PROGRESS_RE = re.compile(r"\[#([0-9a-f]{6}) [^/\s]+/[^(\s]+\((\d+)%\)")
+
+# aria2c 在每个文件下载完成时输出的通知，例如 "[NOTICE] Download complete: ./a/b.bin"
+DOWNLOAD_COMPLETE_MARKER = "Download complete: "
+
+def normalize_path(path):
+    """规范化本地路径，用于匹配 aria2c 输出中的文件路径"""
+    return os.path.normcase(os.path.abspath(path))
+
+@lru_cache(maxsize=16)
+def darken_color(color):
+    """辅助函数：将颜色变暗一点"""
+    color = color.lstrip('#')
+    rgb = tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
+    darkened_rgb = tuple(max(0, c - 30) for c in rgb)
+    return f"#{darkened_rgb[0]:02x}{darkened_rgb[1]:02x}{darkened_rgb[2]:02x}"
+
+@lru_cache(maxsize=16)
+def _button_style(color):
+    """生成按钮样式表，同一颜色只生成一次"""
+    return f"""
+            QPushButton {{
+                padding: 10px 20px;
+                border: none;
+                border-radius: 5px;
+                color: white;
+                background-color: {color};
+                font-weight: bold;
+            }}
+            QPushButton:hover {{
+                background-color: {darken_color(color)};
+            }}
+            QPushButton:pressed {{
+                background-color: {darken_color(darken_color(color))};
+            }}
+            QPushButton:disabled {{
+                background-color: #bdc3c7;
+                color: #6c757d;
+            }}
+        """
+
+logger = logging.getLogger("hf_model_downloader")
+
+def setup_logging():
+    """将运行日志写入滚动日志文件（单个文件最大 1MB，保留 3 个备份）"""
+    handler = RotatingFileHandler(
+        os.path.abspath("hf_model_downloader.log"), maxBytes=1024 * 1024, backupCount=3, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+# 共享的 HfApi 实例，复用底层 HTTP 连接
+_HF_API = HfApi()
+
+@lru_cache(maxsize=32)
+def _cached_repo_files(repo_id, revision="main"):
+    """获取仓库文件列表及文件大小 ((路径, 大小), ...)，结果按仓库缓存，重复加载同一仓库时无需再次请求"""
+    info = _HF_API.model_info(repo_id, revision=revision, files_metadata=True)
+    return tuple((sibling.rfilename, sibling.size) for sibling in info.siblings)
+
+def is_file_complete(path, expected_size):
+    """本地文件大小与远端一致，且没有 aria2c 的断点控制文件时，视为已下载完成"""
+    try:
+        return os.path.getsize(path) == expected_size and not os.path.exists(path + ".aria2")
+    except OSError:
+        return False
+
+class ListFilesSignals(QObject):
+    done = pyqtSignal(list, dict)  # 文件列表加载成功：文件路径列表, {路径: 大小}
+    error = pyqtSignal(str)  # 加载过程中发生错误
+
+class ListFilesTask(QRunnable):
+    """在 QThreadPool 中获取仓库文件列表的任务"""
+
+    def __init__(self, repo_id):
+        super().__init__()
+        self.repo_id = repo_id
+        self.signals = ListFilesSignals()
+
+    def run(self):
+        try:
+            repo_files = _cached_repo_files(self.repo_id)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+        files = [path for path, _ in repo_files]
+        sizes = {path: size for path, size in repo_files if size is not None}
+        self.signals.done.emit(files, sizes)
+
 class DownloadWorker(QThread):
     progress = pyqtSignal(int, str)  # 进度百分比, 当前文件名
     finished = pyqtSignal()          # 所有文件成功下载完成
@@ -29,18 +141,20 @@ class DownloadWorker(QThread):
     resumed = pyqtSignal()           # 用户继续下载
     error = pyqtSignal(str)          # 下载过程中发生错误
 
-    def __init__(self, repo_id, local_dir, selected_files, speed_limit=None):
+    def __init__(self, repo_id, local_dir, selected_files, speed_limit=None, parallel_files=3,
+                 file_sizes=None):
         super().__init__()
         self.repo_id = repo_id
         self.local_dir = local_dir
         self.selected_files = selected_files
         self.speed_limit = speed_limit  # 如 "500K", "2M", None 表示不限速
+        self.parallel_files = parallel_files  # aria2c 同时下载的文件数
+        self.file_sizes = file_sizes or {}  # 远端文件大小，用于跳过已下载完成的文件
         self.running = True  # 用于控制线程
         self.is_paused = False  # 新增：暂停状态
-        self.pause_requested = threading.Event()  # 用于线程同步
-        self.pause_requested.set()  # 初始为运行状态
+        self._last_emit_ts = 0.0  # 上次发送进度信号的时间
 
-        # 用于存储当前正在下载的进程
+        # 用于存储当前正在下载的 aria2c 进程
         self.current_process = None
 
     def run(self):
@@ -55,121 +169,224 @@ class DownloadWorker(QThread):
         final_dir = os.path.join(self.local_dir, model_name)
         os.makedirs(final_dir, exist_ok=True)
 
-        # 查找 aria2c.exe 的路径
-        aria2c_path = resource_path("aria2c.exe")
+        # 查找 aria2c 的路径
+        aria2c_path = find_aria2c()
 
-        if not os.path.exists(aria2c_path):
-            self.error.emit(f"未找到 aria2c.exe: {aria2c_path}")
+        if not aria2c_path:
+            self.error.emit(f"未找到 aria2c: 请将 aria2c.exe 放在 {resource_path('')} 下，或将 aria2c 安装到 PATH")
             return
 
-        for i, file_path in enumerate(self.selected_files):
+        # 预先计算每个文件的 (仓库内路径, 下载 URL, 保存目录, 文件名, 本地完整路径)
+        base_url = f"https://huggingface.co/{self.repo_id}/resolve/main/"
+        plans = []
+        for file_path in self.selected_files:
+            parts = file_path.split("/")
+            target_dir = os.path.join(final_dir, *parts[:-1])
+            plans.append((file_path, base_url + file_path, target_dir, parts[-1],
+                          os.path.join(target_dir, parts[-1])))
+
+        # 构造 aria2c 批量输入：每个文件一行 URL，后跟缩进的 gid/dir/out 选项
+        completed = 0
+        entries = []
+        unique_dirs = set()  # 需要创建的目录，每个目录只创建一次
+        pending = {}  # 规范化后的本地路径 -> gid
+        gid_files = {}  # gid 前 6 位（即进度输出中显示的部分）-> 仓库内文件路径
+        for i, (file_path, url, target_dir, out, full_path) in enumerate(plans):
+            expected_size = self.file_sizes.get(file_path)
+            if expected_size is not None and is_file_complete(full_path, expected_size):
+                # 本地已有完整文件，无需交给 aria2c
+                completed += 1
+                self._emit_progress(int(completed / total * 100), file_path)
+                continue
+            unique_dirs.add(target_dir)
+            gid = f"{i + 1:06x}"
+            entries.append(
+                f"{url}\n"
+                f"  gid={gid}{'0' * 10}\n"
+                f"  dir={target_dir}\n"
+                f"  out={out}\n"
+            )
+            pending[normalize_path(full_path)] = gid
+            gid_files[gid] = file_path
+
+        if not entries:
+            # 所有文件均已存在
+            self.finished.emit()
+            return
+
+        for directory in unique_dirs:
+            os.makedirs(directory, exist_ok=True)
+
+        # 写入临时输入文件（Windows 下需关闭后 aria2c 才能读取）
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".txt", delete=False, encoding="utf-8"
+        ) as input_file:
+            input_file.write("".join(entries))
+
+        # 构建 aria2c 命令：单个进程调度全部文件，复用到 huggingface.co 的连接
+        cmd = [
+            aria2c_path,  # 使用找到的路径
+            "-x", "8",
+            "-s", "8",
+            "-j", str(self.parallel_files),
+            # 小于 2 倍 min-split-size 的文件（config.json 等）不再拆分，只用一个连接
+            "--min-split-size=1M",
+            "--piece-length=1M",
+            "--enable-http-pipelining=true",
+            # 下载前预分配完整文件，减少大文件碎片，并行分段写入时无需不断扩展文件
+            "--file-allocation=falloc",
+            "--continue=true",
+            "--auto-file-renaming=false",
+            "--summary-interval=1",  # 每秒输出一次进度，用于更新进度条
+            "-i", input_file.name,
+        ]
+
+        if self.speed_limit:
+            # 多个文件同时下载，限速作用于整体而不是单个文件
+            cmd.extend(["--max-overall-download-limit", self.speed_limit])
+
+        active = {}  # 正在下载的 gid -> 该文件的完成百分比
+        error_lines = []
+        recent_output = deque(maxlen=10)  # 保留最近几行输出，用于错误提示
+        try:
+            # 启动进程，并隐藏控制台窗口 👇
+            process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,  # 合并到 stdout，只需读取一个管道
+                universal_newlines=True,
+                encoding="utf-8",  # 与输入文件编码一致，避免中文路径在非 UTF-8 区域设置下解码出错
+                errors="replace",
+                bufsize=1,
+                creationflags=CREATE_NO_WINDOW  # ✅ 关键：隐藏终端窗口
+            )
+
+            # 存储当前进程，以便在暂停/停止时可以控制它
+            self.current_process = process
+            if self.is_paused:
+                # 进程启动前用户已点击暂停
+                self._suspend_process_tree()
+
+            # 阻塞等待 aria2c 输出，根据进度输出和完成通知更新进度；
+            # 进程结束（或被 stop() 终止）时 stdout 关闭，循环随之退出
+            # （暂停时 aria2c 被挂起，不再产生输出，读取自然阻塞）
+            for output in process.stdout:
+                if not self.running:
+                    break
+
+                recent_output.append(output.strip())
+                match = PROGRESS_RE.search(output)
+                if match:
+                    gid, file_percent = match.group(1), int(match.group(2))
+                    if gid in gid_files:
+                        active[gid] = file_percent
+                        # 更新进度：已完成文件 + 正在下载文件的部分进度
+                        percent = int((completed * 100 + sum(active.values())) / total)
+                        self._emit_progress(percent, gid_files[gid])
+                elif DOWNLOAD_COMPLETE_MARKER in output:
+                    done_path = output.split(DOWNLOAD_COMPLETE_MARKER, 1)[1].strip()
+                    gid = pending.pop(normalize_path(done_path), None)
+                    if gid is not None:
+                        # 更新进度
+                        active.pop(gid, None)
+                        completed += 1
+                        percent = int((completed * 100 + sum(active.values())) / total)
+                        self._emit_progress(percent, gid_files[gid])
+                elif "[ERROR]" in output:
+                    error_lines.append(output.strip())
+
+            # 用户停止时确保进程已终止（stop() 可能早于进程启动被调用）
             if not self.running:
-                # 用户点击了“停止”，优雅退出，不视为错误或完成
-                self.cancelled.emit()
+                process.terminate()
+
+            # 等待进程结束
+            return_code = process.wait()
+
+            # 如果是用户主动停止，return_code 可能为 1，但不应视为错误
+            if return_code != 0 and self.running:
+                # 只有在不是用户主动停止的情况下才视为错误
+                error_output = "\n".join(error_lines or recent_output)
+                raise Exception(f"aria2c 下载失败 (退出码 {return_code}): {error_output}")
+
+        except Exception as e:
+            # 只有在不是用户主动停止的情况下才发送错误信号
+            if self.running:
+                # 读取输出出错时 aria2c 可能仍在运行，先终止它，避免残留后台下载
+                self._terminate_process_tree()
+                failed = ", ".join(gid_files[gid] for gid in pending.values())
+                self.error.emit(f"下载失败: {failed}\n错误: {str(e)}")
                 return
+        finally:
+            os.remove(input_file.name)
 
-            try:
-                # 构造下载 URL
-                url = f"https://huggingface.co/{self.repo_id}/resolve/main/{file_path}"
-                # 构造本地保存路径（在模型名子目录下）
-                full_path = os.path.join(final_dir, file_path)
-                os.makedirs(os.path.dirname(full_path), exist_ok=True)
-
-                # 构建 aria2c 命令
-                cmd = [
-                    aria2c_path,  # 使用找到的路径
-                    "-x", "16",
-                    "-s", "16",
-                    "-j", "5",
-                    "--continue=true",
-                    "--dir", os.path.dirname(full_path),
-                    "--out", os.path.basename(full_path),
-                    url
-                ]
-
-                if self.speed_limit:
-                    cmd.extend(["--max-download-limit", self.speed_limit])
-
-                # 启动进程，并隐藏控制台窗口 👇
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                    bufsize=1,
-                    creationflags=subprocess.CREATE_NO_WINDOW  # ✅ 关键：隐藏终端窗口
-                )
-
-                # 存储当前进程，以便在暂停时可以控制它
-                self.current_process = process
-
-                # 实时读取输出，用于检查进程是否仍在运行
-                while True:
-                    if not self.running:
-                        process.terminate()
-                        break
-
-                    # 检查暂停状态
-                    if self.is_paused and self.running:
-                        # 不终止进程，只是暂停处理进度
-                        # 让 aria2c 继续运行，Python 线程等待
-                        self.pause_requested.wait()  # 等待恢复
-                        if not self.running:
-                            process.terminate()
-                            self.cancelled.emit()
-                            return
-                        # 恢复后，继续读取输出
-                        continue
-
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        # 可选：打印调试信息
-                        # print(output.strip())
-                        pass
-
-                # 等待进程结束
-                return_code = process.wait()
-
-                # 如果是用户主动停止，return_code 可能为 1，但不应视为错误
-                if return_code != 0 and self.running:
-                    # 只有在不是用户主动停止的情况下才视为错误
-                    stderr_output = process.stderr.read()
-                    raise Exception(f"aria2c 下载失败 (退出码 {return_code}): {stderr_output}")
-
-                # 更新进度
-                percent = int((i + 1) / total * 100)
-                self.progress.emit(percent, file_path)
-
-            except Exception as e:
-                # 只有在不是用户主动停止的情况下才发送错误信号
-                if self.running:
-                    self.error.emit(f"下载失败: {file_path}\n错误: {str(e)}")
-                    return
+        if not self.running:
+            # 用户点击了“停止”，优雅退出，不视为错误或完成
+            self.cancelled.emit()
+            return
 
         # 所有文件都成功下载完毕
         self.finished.emit()
 
+    def _emit_progress(self, percent, file_path):
+        # 限制跨线程进度信号的频率（约每 0.1 秒一次），100% 总是发送
+        now = time.monotonic()
+        if now - self._last_emit_ts > 0.1 or percent == 100:
+            self.progress.emit(percent, file_path)
+            self._last_emit_ts = now
+
     def stop(self):
         self.running = False
-        self.is_paused = False  # 确保暂停状态被清除
-        self.pause_requested.set()  # 唤醒任何等待的线程
-        if self.current_process:
-            self.current_process.terminate()
+        if self.is_paused:
+            # 被挂起的进程在 POSIX 上收不到终止信号，需先恢复
+            self._resume_process_tree()
+            self.is_paused = False  # 确保暂停状态被清除
+        self._terminate_process_tree()
 
     def pause(self):
         if self.running and not self.is_paused:
             self.is_paused = True
-            self.pause_requested.clear()  # 清除事件，使 wait() 阻塞
+            # 挂起 aria2c 进程（POSIX 上为 SIGSTOP），真正停止网络传输
+            self._suspend_process_tree()
             self.paused.emit()
 
     def resume(self):
         if self.running and self.is_paused:
             self.is_paused = False
-            self.pause_requested.set()  # 设置事件，使 wait() 唤醒
+            self._resume_process_tree()
             self.resumed.emit()
 
+    def _process_tree(self):
+        """返回当前 aria2c 进程及其所有子进程"""
+        if self.current_process is None:
+            return []
+        try:
+            parent = psutil.Process(self.current_process.pid)
+            return parent.children(recursive=True) + [parent]
+        except psutil.NoSuchProcess:
+            return []
+
+    def _terminate_process_tree(self):
+        # 终止 aria2c 及其子进程，避免残留进程继续占用带宽和磁盘
+        for proc in self._process_tree():
+            try:
+                proc.terminate()
+            except psutil.NoSuchProcess:
+                pass
+
+    def _suspend_process_tree(self):
+        for proc in self._process_tree():
+            try:
+                proc.suspend()
+            except psutil.NoSuchProcess:
+                pass
+
+    def _resume_process_tree(self):
+        for proc in self._process_tree():
+            try:
+                proc.resume()
+            except psutil.NoSuchProcess:
+                pass
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -292,15 +509,38 @@ class MainWindow(QMainWindow):
         config_layout.addWidget(speed_label, 2, 0)
         config_layout.addLayout(speed_layout, 2, 1, 1, 2)
 
+        # 并行下载文件数
+        parallel_label = QLabel("并行文件数:")
+        parallel_label.setFont(QFont("Arial", 10, QFont.Weight.Bold))
+        parallel_label.setStyleSheet("color: #2d3436;")
+        self.parallel_spinbox = QSpinBox()
+        self.parallel_spinbox.setRange(1, 10)
+        self.parallel_spinbox.setValue(3)
+        self.parallel_spinbox.setFont(QFont("Consolas", 10))
+        self.parallel_spinbox.setStyleSheet("""
+            QSpinBox {
+                padding: 6px;
+                border: 1px solid #bdc3c7;
+                border-radius: 5px;
+                background-color: #ffffff;
+                color: #2d3436;
+            }
+            QSpinBox:focus {
+                border: 2px solid #3498db;
+            }
+        """)
+        config_layout.addWidget(parallel_label, 3, 0)
+        config_layout.addWidget(self.parallel_spinbox, 3, 1, 1, 2)
+
         config_group.setLayout(config_layout)
         main_layout.addWidget(config_group)
 
         # 加载按钮
-        load_btn = QPushButton("🔍 加载文件列表")
-        load_btn.setFont(QFont("Arial", 12, QFont.Weight.Bold))
-        load_btn.setStyleSheet(self.get_button_style("#3498db"))
-        load_btn.clicked.connect(self.load_file_list)
-        main_layout.addWidget(load_btn)
+        self.load_btn = QPushButton("🔍 加载文件列表")
+        self.load_btn.setFont(QFont("Arial", 12, QFont.Weight.Bold))
+        self.load_btn.setStyleSheet(self.get_button_style("#3498db"))
+        self.load_btn.clicked.connect(self.load_file_list)
+        main_layout.addWidget(self.load_btn)
 
         # 选择文件区域（恢复为原始样式）
         file_group = QGroupBox("选择文件")
@@ -350,6 +590,7 @@ class MainWindow(QMainWindow):
         self.status_text = QTextEdit()
         self.status_text.setReadOnly(True)
         self.status_text.setMaximumHeight(150)
+        self.status_text.document().setMaximumBlockCount(500)  # 只保留最近 500 行，完整日志见日志文件
         self.status_text.setStyleSheet("""
             QTextEdit {
                 background-color: #f8f9fa;
@@ -391,6 +632,10 @@ class MainWindow(QMainWindow):
 
         # 初始化变量
         self.file_paths = []
+        self.file_sizes = {}
+        self._item_pool = []  # 重新加载时复用的 QListWidgetItem
+        self._last_log_file = None  # 最近一条进度日志对应的文件
+        self._last_log_time = 0.0
         self.worker = None
 
     def get_stylesheet(self):
@@ -440,33 +685,7 @@ class MainWindow(QMainWindow):
 
     def get_button_style(self, color):
         """返回按钮样式"""
-        return f"""
-            QPushButton {{
-                padding: 10px 20px;
-                border: none;
-                border-radius: 5px;
-                color: white;
-                background-color: {color};
-                font-weight: bold;
-            }}
-            QPushButton:hover {{
-                background-color: {self.darken_color(color)};
-            }}
-            QPushButton:pressed {{
-                background-color: {self.darken_color(self.darken_color(color))};
-            }}
-            QPushButton:disabled {{
-                background-color: #bdc3c7;
-                color: #6c757d;
-            }}
-        """
-
-    def darken_color(self, color):
-        """辅助函数：将颜色变暗一点"""
-        color = color.lstrip('#')
-        rgb = tuple(int(color[i:i+2], 16) for i in (0, 2, 4))
-        darkened_rgb = tuple(max(0, c - 30) for c in rgb)
-        return f"#{darkened_rgb[0]:02x}{darkened_rgb[1]:02x}{darkened_rgb[2]:02x}"
+        return _button_style(color)
 
     def on_speed_checkbox_changed(self, state):
         self.speed_input.setEnabled(state == Qt.CheckState.Checked.value)
@@ -483,32 +702,48 @@ class MainWindow(QMainWindow):
             return
 
         self.status_text.clear()
-        self.status_text.append("⏳ 正在加载文件列表...")
-
-        try:
-            api = HfApi()
-            files = api.list_repo_files(repo_id=repo_id)
-            self.file_paths = files
-
-            self.file_list_widget.clear()
-            for file_path in files:
+        self.append_log("⏳ 正在加载文件列表...")
+
+        # 在全局线程池中请求文件列表，避免界面卡住
+        self.load_btn.setEnabled(False)
+        task = ListFilesTask(repo_id)
+        task.signals.done.connect(self.populate_file_list)
+        task.signals.error.connect(self.load_file_list_error)
+        QThreadPool.globalInstance().start(task)
+
+    def populate_file_list(self, files, file_sizes):
+        self.file_paths = files
+        self.file_sizes = file_sizes
+
+        # 批量填充：暂停重绘和信号，使用原生可勾选条目代替逐行嵌入 QCheckBox
+        self.file_list_widget.setUpdatesEnabled(False)
+        self.file_list_widget.blockSignals(True)
+        # 将现有条目取回对象池，而不是 clear() 销毁后重新创建
+        for row in range(self.file_list_widget.count() - 1, -1, -1):
+            self._item_pool.append(self.file_list_widget.takeItem(row))
+        for file_path in files:
+            if self._item_pool:
+                item = self._item_pool.pop()
+            else:
                 item = QListWidgetItem()
-                checkbox = QCheckBox(file_path)
-                checkbox.setChecked(True)
-                # 不设置自定义样式，保持默认
-                item.setSizeHint(checkbox.sizeHint())
-                self.file_list_widget.addItem(item)
-                self.file_list_widget.setItemWidget(item, checkbox)
+                item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setText(file_path)
+            item.setCheckState(Qt.CheckState.Checked)
+            self.file_list_widget.addItem(item)
+        self.file_list_widget.blockSignals(False)
+        self.file_list_widget.setUpdatesEnabled(True)
 
-            # 只显示总文件数量
-            self.file_count_label.setText(f"共 {len(files)} 个文件")
+        # 只显示总文件数量
+        self.file_count_label.setText(f"共 {len(files)} 个文件")
 
-            self.status_text.append(f"✅ 成功加载 {len(files)} 个文件")
-            self.download_btn.setEnabled(True)
+        self.append_log(f"✅ 成功加载 {len(files)} 个文件")
+        self.download_btn.setEnabled(True)
+        self.load_btn.setEnabled(True)
 
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"加载文件列表失败:\n{str(e)}")
-            self.status_text.append(f"❌ 错误: {str(e)}")
+    def load_file_list_error(self, error_msg):
+        QMessageBox.critical(self, "错误", f"加载文件列表失败:\n{error_msg}")
+        self.append_log(f"❌ 错误: {error_msg}")
+        self.load_btn.setEnabled(True)
 
     def start_download(self):
         repo_id = self.repo_input.text().strip()
@@ -519,12 +754,9 @@ class MainWindow(QMainWindow):
             return
 
         # 获取选中的文件
-        selected_files = []
-        for i in range(self.file_list_widget.count()):
-            item = self.file_list_widget.item(i)
-            widget = self.file_list_widget.itemWidget(item)
-            if isinstance(widget, QCheckBox) and widget.isChecked():
-                selected_files.append(widget.text())
+        lw = self.file_list_widget
+        selected_files = [lw.item(i).text() for i in range(lw.count())
+                          if lw.item(i).checkState() == Qt.CheckState.Checked]
 
         if not selected_files:
             QMessageBox.information(self, "提示", "没有选择任何文件！")
@@ -534,12 +766,13 @@ class MainWindow(QMainWindow):
         speed_limit = None
         if self.speed_checkbox.isChecked():
             speed_limit = self.speed_input.text().strip()
-            if speed_limit and not any(c in speed_limit.upper() for c in ['K', 'M', 'G']):
+            if speed_limit and not SPEED_LIMIT_RE.fullmatch(speed_limit):
                 QMessageBox.warning(self, "警告", "限速格式错误！请使用如 500K, 2M")
                 return
 
         # 创建下载线程
-        self.worker = DownloadWorker(repo_id, local_dir, selected_files, speed_limit)
+        self.worker = DownloadWorker(repo_id, local_dir, selected_files, speed_limit,
+                                     self.parallel_spinbox.value(), self.file_sizes)
         self.worker.progress.connect(self.update_progress)
         self.worker.finished.connect(self.download_finished)
         self.worker.cancelled.connect(self.download_cancelled)
@@ -555,30 +788,40 @@ class MainWindow(QMainWindow):
         self.stop_btn.setEnabled(True)
         # 显示即将创建的模型文件夹名
         model_name = repo_id.split("/")[-1]
-        self.status_text.append(f"⏳ 开始下载 {len(selected_files)} 个文件到子目录: {model_name}")
+        self.append_log(f"⏳ 开始下载 {len(selected_files)} 个文件到子目录: {model_name}")
+
+    def append_log(self, message):
+        """在日志框中显示一条消息，并写入日志文件"""
+        self.status_text.append(message)
+        logger.info(message)
 
     def update_progress(self, percent, current_file):
         self.progress_bar.setValue(percent)
-        self.status_text.append(f"📦 正在下载: {current_file} ({percent}%)")
+        # 进度更新很频繁：同一文件 0.1 秒内只记录一次日志
+        now = time.monotonic()
+        if current_file != self._last_log_file or now - self._last_log_time > 0.1:
+            self.append_log(f"📦 正在下载: {current_file} ({percent}%)")
+            self._last_log_file = current_file
+            self._last_log_time = now
 
     def pause_download(self):
         if self.worker:
             self.worker.pause()
-            self.status_text.append("⏸️ 用户请求暂停下载...")
+            self.append_log("⏸️ 用户请求暂停下载...")
 
     def resume_download(self):
         if self.worker:
             self.worker.resume()
-            self.status_text.append("▶️ 用户请求继续下载...")
+            self.append_log("▶️ 用户请求继续下载...")
 
     def stop_download(self):
         if self.worker and self.worker.running:
             self.worker.stop()
-            self.status_text.append("🛑 用户请求停止下载...")
+            self.append_log("🛑 用户请求停止下载...")
 
     def download_paused(self):
         # 用户主动暂停下载
-        self.status_text.append("⏸️ 下载已暂停。")
+        self.append_log("⏸️ 下载已暂停。")
         # 更新按钮状态：暂停下载 -> 继续下载
         self.download_btn.setText("▶️ 继续下载")
         self.download_btn.clicked.disconnect()
@@ -586,7 +829,7 @@ class MainWindow(QMainWindow):
 
     def download_resumed(self):
         # 用户主动继续下载
-        self.status_text.append("▶️ 下载已继续。")
+        self.append_log("▶️ 下载已继续。")
         # 更新按钮状态：继续下载 -> 暂停下载
         self.download_btn.setText("⏸️ 暂停下载")
         self.download_btn.clicked.disconnect()
@@ -594,7 +837,7 @@ class MainWindow(QMainWindow):
 
     def download_finished(self):
         self.progress_bar.setValue(100)
-        self.status_text.append("🎉 所有文件下载完成！")
+        self.append_log("🎉 所有文件下载完成！")
         QMessageBox.information(self, "成功", "所有选中文件已下载完毕！")
         # 恢复初始按钮状态
         self.download_btn.setText("🚀 开始下载")
@@ -604,15 +847,23 @@ class MainWindow(QMainWindow):
 
     def download_cancelled(self):
         # 用户主动取消下载
-        self.status_text.append("⏸️ 下载已由用户取消。")
+        self.append_log("⏸️ 下载已由用户取消。")
         # 恢复初始按钮状态
         self.download_btn.setText("🚀 开始下载")
         self.download_btn.clicked.disconnect()
         self.download_btn.clicked.connect(self.start_download)
         self.stop_btn.setEnabled(False)
 
+    def closeEvent(self, event):
+        # 关闭窗口时停止正在进行的下载，避免 aria2c 在后台继续运行
+        if self.worker and self.worker.isRunning():
+            self.worker.stop()
+            if not self.worker.wait(2000):
+                self.worker.terminate()
+        super().closeEvent(event)
+
     def download_error(self, error_msg):
-        self.status_text.append(f"❌ 下载出错: {error_msg}")
+        self.append_log(f"❌ 下载出错: {error_msg}")
         QMessageBox.critical(self, "错误", f"下载过程中发生错误:\n{error_msg}")
         # 恢复初始按钮状态
         self.download_btn.setText("🚀 开始下载")
@@ -622,6 +873,7 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    setup_logging()
     app = QApplication(sys.argv)
     app.setStyle('Fusion')  # 使用 Fusion 风格，看起来更现代
 